@@ -1,155 +1,112 @@
 import argparse
+from array import array
+import calendar
 import datetime
+import heapq
+import itertools
 import os
-from dateutil import relativedelta
+import sys
 import csv
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 # Constants
 REQUIRED_INPUT_FIELDS = {'name', 'frequency', 'next_date', 'amount', 'transaction_type'}
-DEFAULT_COLUMN_SIZE = 12
 COLUMN_BUFFER = 4
-
-class LedgerEntry:
-    def __init__(self, date, name, amount, balance):
-        self.date = date
-        self.name = name
-        self.amount = amount
-        self.balance = balance
-
-    def to_dict(self) -> dict[str:any]:
-        new_dict = {
-            "date": self.date,
-            "name": self.name,
-            "amount": self.amount,
-            "balance": self.balance
-        }
-        return new_dict
-
-    def __str__(self):
-        date_col = f"{self.date}"
-        name_col = f"  {self.name}" + (" " * (21 - len(self.name)))
-        if self.amount < 0:
-            amount_col = f"-${abs(self.amount):.2f}"
-        else:
-            amount_col = f"+${self.amount:.2f}"
-        if self.balance < 0:
-            balance_col = f"\tBalance -${abs(self.balance):.2f}"
-        else:
-            balance_col = f"\tBalance: ${self.balance:.2f}"
-
-        output = date_col + name_col + amount_col + balance_col
-        return output
-
+EXPORT_BUFFER_SIZE = 1 << 20
+# Largest magnitude the signed 64-bit ledger columns can hold
+MAX_CENTS = 2 ** 63 - 1
+TRANSACTION_SIGNS = {'income': 1, 'expense': -1}
+# Day based frequencies are a timedelta, month based ones a number of months
+FREQUENCIES = {
+    'daily': datetime.timedelta(days=1),
+    'weekly': datetime.timedelta(weeks=1),
+    'biweekly': datetime.timedelta(weeks=2),
+    'monthly': 1,
+    'quarterly': 3,
+    'semiyearly': 6,
+    'yearly': 12,
+}
 
 class RecurringTransaction:
-    def __init__(self, ledger, name, transaction_type, amount, frequency, next_date):
+    __slots__ = ('name', 'transaction_type', 'amount', 'frequency_name', 'frequency', 'next_date')
+
+    def __init__(self, name, transaction_type, amount, frequency, next_date):
+        # Each field is validated once here; nothing reassigns them except advance_next_date
         self.name = name
-        self.sign = None
         self.transaction_type = transaction_type
-        self.amount = amount
-        self.frequency = frequency
-        self.next_date = next_date
-        self.ledger = ledger
-
-    @property
-    def transaction_type(self):
-        return self._transaction_type
-
-    @transaction_type.setter
-    def transaction_type(self, value):
-        if value not in ["income","expense"]:
-            exit_application(f"Transaction_type for {self.name} must be 'income' or 'expense'.")
-        self._transaction_type = value
-        if value == "income":
-            self.sign = '+'
-        else:
-            self.sign = '-'
-
-    @property
-    def amount(self):
-        return self._amount
-
-    @amount.setter
-    def amount(self, value):
+        sign = TRANSACTION_SIGNS.get(transaction_type) or exit_application(
+            f"Transaction_type for {self.name} must be 'income' or 'expense'.")
         try:
-            value = round(float(value), 2)
-        except ValueError:
-            exit_application(f"Amount of '{value}' for {self.name} is invalid.")
-        if self.transaction_type == "expense":
-            value = -abs(value)
-        else:
-            value = abs(value)
-        self._amount = value
-
-        # try:
-        #     self._amount = round(float(value), 2)
-        # except ValueError:
-        #     raise Exception(f"Amount of '{value}' for {self.name} is invalid.")
-
-    @property
-    def frequency(self):
-        return self._frequency
-
-    @frequency.setter
-    def frequency(self, value):
-        valid_freq = ["daily", "weekly", "biweekly", "monthly", "quarterly", "semiyearly", "yearly"]
-        if not value in valid_freq: #raise Exception(f"Invalid frequency for {self.name}.")
-            exit_application(f"Invalid frequency for {self.name}.")
-        match value:
-            case "daily":
-                self._frequency = relativedelta.relativedelta(days=1)
-            case "weekly":
-                self._frequency = relativedelta.relativedelta(weeks=1)
-            case "biweekly":
-                self._frequency = relativedelta.relativedelta(weeks=2)
-            case "monthly":
-                self._frequency = relativedelta.relativedelta(months=1)
-            case "quarterly":
-                self._frequency = relativedelta.relativedelta(months=3)
-            case "semiyearly":
-                self._frequency = relativedelta.relativedelta(months=6)
-            case "yearly":
-                self._frequency = relativedelta.relativedelta(years=1)
-
-    @property
-    def next_date(self):
-        return self._next_date
-
-    @next_date.setter
-    def next_date(self, value):
-        today = datetime.date.today()
-        if type(value) is datetime.date and value >= today:
-            self._next_date = value
-            return
+            self.amount = sign * abs(to_cents(amount))
+        except (ValueError, OverflowError):
+            exit_application(f"Amount of '{amount}' for {self.name} is invalid.")
+        self.frequency_name = frequency
+        self.frequency = self.parse_frequency(frequency)
+        self.next_date = self.parse_next_date(next_date)
+
+    def parse_frequency(self, value):
+        return FREQUENCIES.get(value) or exit_application(f"Invalid frequency for {self.name}.")
+
+    def parse_next_date(self, value) -> datetime.date:
+        # CSV input is always a string, so try parsing first and only fall back to date objects
         try:
             date = datetime.date.fromisoformat(value)
+        except TypeError:
+            if not isinstance(value, datetime.date):
+                exit_application(f"next_date for {self.name} is in an invalid format. Use YYYY-MM-DD.")
+            date = value.date() if isinstance(value, datetime.datetime) else value
         except ValueError:
             exit_application(f"next_date for {self.name} is in an invalid format. Use YYYY-MM-DD.")
-        while today > date:
-            date += self.frequency
-        self._next_date = date
+        today = datetime.date.today()
+        if today > date:
+            date = self.add_frequency(date, self.periods_until(date, today))
+        return date
+
+    def periods_until(self, date: datetime.date, target: datetime.date) -> int:
+        # Fewest whole periods that move date on or past target
+        if isinstance(self.frequency, datetime.timedelta):
+            return -(-(target - date).days // self.frequency.days)
+        months_behind = (target.year - date.year) * 12 + (target.month - date.month)
+        periods = months_behind // self.frequency
+        if add_months(date, periods * self.frequency) < target:
+            periods += 1
+        return periods
 
     def __str__(self):
         return (f"Name: {self.name}, Type: {self.transaction_type}, "
-              f"Amount: {self.amount:.2f}, Frequency: {self.frequency}, Next Date: {self.next_date}")
+              f"Amount: {format_cents(self.amount, grouping=False)}, Frequency: {self.frequency_name}, Next Date: {self.next_date}")
 
-    def advance_next_date(self):
-        self.next_date += self.frequency
+    def add_frequency(self, date: datetime.date, periods: int = 1) -> datetime.date:
+        if isinstance(self.frequency, datetime.timedelta):
+            return date + self.frequency * periods
+        if periods == 1:
+            return add_months(date, self.frequency)
+        return add_months_repeated(date, self.frequency, periods)
 
-    def is_due(self) -> bool:
-        return self.next_date == self.ledger.current_day
+    def advance_next_date(self):
+        self.next_date = self.add_frequency(self.next_date)
 
 
 class Ledger:
     def __init__(self, csv_input, days, starting_balance):
         self.csv_input = csv_input
         self.days = days
-        self.starting_balance = starting_balance
+        # Money is held as integer cents throughout the ledger
+        self.starting_balance = to_cents(starting_balance)
         self.current_day = datetime.date.today()
-        self.end_day = self.current_day + relativedelta.relativedelta(days=self.days)
+        self.end_day = self.current_day + datetime.timedelta(days=self.days)
 
         self.recurring_transactions: list[RecurringTransaction] = []
-        self.transaction_log: list[LedgerEntry | None] = []
+        # Transaction log is stored column-wise, one entry per index
+        self.log_dates: list[datetime.date] = []
+        self.log_names: list[str] = []
+        self.log_amounts = array('q')
+        self.log_balances = array('q')
+        # Column extremes kept up to date as entries are recorded. The widest formatted
+        # amount or balance is always the smallest or largest value, so only those are kept.
+        self._max_name_len = 0
+        self._min_amount = self._max_amount = 0
+        self._min_balance = self._max_balance = 0
 
         self.import_transactions()
 
@@ -158,69 +115,70 @@ class Ledger:
         self.record_starting_balance_to_ledger()
 
     def import_transactions(self) -> None:
-        transaction_list: list[RecurringTransaction] = []
         with open(self.csv_input, newline='') as csvfile:
-            transaction_csv = csv.DictReader(csvfile, delimiter=',')
-            self.validate_input_fields(transaction_csv)
+            transaction_csv = csv.reader(csvfile, delimiter=',')
+            header = next(transaction_csv, [])
+            idx = self.validate_input_fields(header)
             for row in transaction_csv:
-                transaction_list.append(RecurringTransaction(
-                    ledger=self,
-                    name=row['name'],
-                    transaction_type=row['transaction_type'],
-                    amount=row['amount'],
-                    frequency=row['frequency'],
-                    next_date=row['next_date'],
+                # DictReader skipped blank lines too
+                if not row:
+                    continue
+                # Extra trailing fields are ignored, as DictReader did
+                if len(row) < len(header):
+                    exit_application(f"Error: Line {transaction_csv.line_num} of the input file has "
+                                     f"{len(row)} fields, expected {len(header)}.")
+                self.recurring_transactions.append(RecurringTransaction(
+                    name=row[idx['name']],
+                    transaction_type=row[idx['transaction_type']],
+                    amount=row[idx['amount']],
+                    frequency=row[idx['frequency']],
+                    next_date=row[idx['next_date']],
                 ))
-        self.recurring_transactions = transaction_list
 
     @staticmethod
-    def validate_input_fields(input_csv: csv.DictReader) -> None:
-        csv_fields = set(input_csv.fieldnames)
-        if not csv_fields == REQUIRED_INPUT_FIELDS:
+    def validate_input_fields(fieldnames: list[str]) -> dict[str, int]:
+        # Returns the column index of each required field
+        if len(fieldnames) != len(REQUIRED_INPUT_FIELDS) or REQUIRED_INPUT_FIELDS.difference(fieldnames):
             exit_application(f"Error: Input file does not contain the correct fields.")
+        return {field: fieldnames.index(field) for field in REQUIRED_INPUT_FIELDS}
 
-    def record_transaction(self, transaction):
-        self.current_balance += transaction.amount
-        entry = LedgerEntry(
-            date=self.current_day,
-            name=transaction.name,
-            amount=transaction.amount,
-            balance=self.current_balance
-        )
-        self.transaction_log.append(entry)
-        transaction.advance_next_date()
+    def record_transactions(self, events) -> None:
+        events = list(events)
+        if not events:
+            return
+        amounts = [transaction.amount for _, transaction in events]
+        names = [transaction.name for _, transaction in events]
+        try:
+            balances = running_balances(amounts, self.current_balance)
+        except OverflowError:
+            exit_application("Error: Forecast balance is too large.")
+        self.log_dates.extend([date for date, _ in events])
+        self.log_names.extend(names)
+        self.log_amounts.extend(amounts)
+        self.log_balances.extend(balances)
+        self.update_column_sizes(names, amounts, balances)
+        self.current_day = self.log_dates[-1]
+        self.current_balance = self.log_balances[-1]
 
     def record_starting_balance_to_ledger(self):
-        entry = LedgerEntry(
-            date=self.current_day,
-            name="Opening Balance",
-            amount=self.starting_balance,
-            balance=self.starting_balance
-        )
-        self.transaction_log.append(entry)
-
-    def get_transactions_for_day(self) -> list[RecurringTransaction]:
-        transaction_list = [transaction for transaction in self.recurring_transactions if transaction.is_due()]
-        return transaction_list
-
-    def date_advance(self):
-        self.current_day += relativedelta.relativedelta(days=1)
-
-    def is_active(self) -> bool:
-        return self.current_day <= self.end_day
-
-    def get_max_column_size(self, column:str) -> int:
-        str_lengths = set()
-        for log in self.transaction_log:
-            attr_value = str(getattr(log, column))
-            str_lengths.add(len(attr_value))
-        return max(str_lengths, default=DEFAULT_COLUMN_SIZE)
+        self.log_dates.append(self.current_day)
+        self.log_names.append("Opening Balance")
+        self.log_amounts.append(self.starting_balance)
+        self.log_balances.append(self.starting_balance)
+        self.update_column_sizes(["Opening Balance"], [self.starting_balance], [self.starting_balance])
+
+    def update_column_sizes(self, names, amounts, balances) -> None:
+        self._max_name_len = max(self._max_name_len, max(map(len, names)))
+        self._min_amount = min(self._min_amount, min(amounts))
+        self._max_amount = max(self._max_amount, max(amounts))
+        self._min_balance = min(self._min_balance, min(balances))
+        self._max_balance = max(self._max_balance, max(balances))
 
     def print_ledger(self):
         max_date = 10 + COLUMN_BUFFER
-        max_name = self.get_max_column_size('name') + COLUMN_BUFFER
-        max_amount = self.get_max_column_size('amount') + COLUMN_BUFFER
-        max_balance = self.get_max_column_size('balance') + COLUMN_BUFFER
+        max_name = self._max_name_len + COLUMN_BUFFER
+        max_amount = max(len(format_cents(self._min_amount)), len(format_cents(self._max_amount))) + COLUMN_BUFFER
+        max_balance = max(len(format_cents(self._min_balance)), len(format_cents(self._max_balance))) + COLUMN_BUFFER
         header_date = "Date".ljust(max_date)
         header_name = "Name".ljust(max_name)
         # Add 1 for the $
@@ -231,33 +189,43 @@ class Ledger:
         header = f"{header_date}{header_name}{header_amount}{header_balance}"
 
         separator = '-' * len(header)
-        print(header)
-        print(separator)
-        for log in self.transaction_log:
-            print(f"{log.date.strftime('%Y-%m-%d'):<{max_date}}", end='')
-            print(f"{log.name:<{max_name}}", end='')
-            print(f"${log.amount:>{max_amount},.2f}", end='')
-            print(f"  ${log.balance:>{max_balance},.2f}")
+        # Build the whole report and write it once rather than printing piece by piece
+        lines = [header, separator]
+        row_format = f"{{:<{max_date}}}{{:<{max_name}}}${{:>{max_amount}}}  ${{:>{max_balance}}}"
+        for date, name, amount, balance in zip(self.log_dates, self.log_names, self.log_amounts, self.log_balances):
+            lines.append(row_format.format(date.isoformat(), name, format_cents(amount), format_cents(balance)))
+        sys.stdout.write('\n'.join(lines) + '\n')
 
     def export_ledger(self, path):
-        ledger_data: list[dict] = [entry.to_dict() for entry in self.transaction_log]
-        field_names = ledger_data[0].keys()
         try:
-            with open(path, 'w', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=field_names)
-                writer.writeheader()
-                writer.writerows(ledger_data)
+            with open(path, 'w', newline='', buffering=EXPORT_BUFFER_SIZE) as file:
+                writer = csv.writer(file)
+                writer.writerow(("date", "name", "amount", "balance"))
+                writer.writerows(
+                    (date, name, format_cents(amount, grouping=False), format_cents(balance, grouping=False))
+                    for date, name, amount, balance in zip(self.log_dates, self.log_names, self.log_amounts, self.log_balances)
+                )
         except FileNotFoundError:
             exit_application("Unable to write to the export location")
         except Exception as e:
             exit_application(f"An unexpected error occurred: {e}")
 
+    def schedule_transactions(self):
+        # Min-heap of (next_date, index, transaction); the index breaks ties so
+        # same-day transactions keep their input order.
+        heap = [(transaction.next_date, i, transaction)
+                for i, transaction in enumerate(self.recurring_transactions)]
+        heapq.heapify(heap)
+        while heap:
+            date, i, transaction = heap[0]
+            if date > self.end_day:
+                break
+            yield date, transaction
+            transaction.advance_next_date()
+            heapq.heapreplace(heap, (transaction.next_date, i, transaction))
+
     def run_loop(self):
-        while self.is_active():
-            transaction_list = self.get_transactions_for_day()
-            for transaction in transaction_list:
-                self.record_transaction(transaction)
-            self.date_advance()
+        self.record_transactions(self.schedule_transactions())
 
 
 def main():
@@ -267,6 +235,7 @@ def main():
     parser.add_argument('--days', '-d', type=int, default=30, help='Number of days to forecast (default: 30)')
     parser.add_argument('--start-balance', '-b', type=float, default=0.0, help='Starting balance (default: 0.00')
     parser.add_argument('--export', '-e', help='Optional path to export results as CSV')
+    parser.add_argument('--quiet', '-q', action='store_true', help='Do not print the ledger to the terminal')
 
     args = parser.parse_args()
 
@@ -275,6 +244,10 @@ def main():
         exit_application(f"Error: Input file '{args.input}' not found.")
     if not args.days > 0:
         exit_application(f"Error: Forecast days must be greater than 0.")
+    try:
+        to_cents(args.start_balance)
+    except (ValueError, OverflowError):
+        exit_application(f"Error: Starting balance '{args.start_balance}' is invalid.")
 
     ledger = Ledger(
         csv_input=args.input,
@@ -283,11 +256,63 @@ def main():
     )
 
     ledger.run_loop()
-    ledger.print_ledger()
+    if not args.quiet:
+        ledger.print_ledger()
     if args.export:
         ledger.export_ledger(args.export)
 
 
+def to_cents(value) -> int:
+    # Amounts are rounded half up on their decimal value, e.g. '0.015' -> 2 cents, '0.025' -> 3 cents
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+    except InvalidOperation:
+        # Not a number, infinite, or too large to hold to the cent
+        raise ValueError(f"'{value}' is not a valid amount")
+    if not amount.is_finite():
+        raise ValueError(f"'{value}' is not a finite amount")
+    cents = int(amount * 100)
+    if abs(cents) > MAX_CENTS:
+        raise OverflowError(f"'{value}' is too large")
+    return cents
+
+
+def format_cents(cents: int, grouping: bool = True) -> str:
+    sign = '-' if cents < 0 else ''
+    dollars, cents = divmod(abs(cents), 100)
+    if grouping:
+        return f"{sign}{dollars:,}.{cents:02d}"
+    return f"{sign}{dollars}.{cents:02d}"
+
+
+def running_balances(amounts: list[int], starting_balance: int) -> array:
+    # Balance after each amount, computed in a single pass. Any rules applied to the
+    # running balance (overdraft limits, floors, ...) belong here.
+    balances = itertools.accumulate(amounts, initial=starting_balance)
+    next(balances)  # skip the starting balance itself
+    return array('q', balances)
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    # Clamp the day to the end of the target month, e.g. Jan 31 + 1 month -> Feb 28
+    year, month = divmod(date.month - 1 + months, 12)
+    year += date.year
+    day = min(date.day, calendar.monthrange(year, month + 1)[1])
+    return datetime.date(year, month + 1, day)
+
+
+def add_months_repeated(date: datetime.date, months: int, times: int) -> datetime.date:
+    # Same result as calling add_months `times` times: the day ends up capped by the shortest
+    # month landed on. Month lengths repeat every year and any four consecutive Februaries
+    # include a 28 day one, so the first 48 landings already reach the smallest cap.
+    day = date.day
+    for step in range(1, min(times, 48) + 1):
+        year, month = divmod(date.month - 1 + step * months, 12)
+        day = min(day, calendar.monthrange(date.year + year, month + 1)[1])
+    year, month = divmod(date.month - 1 + times * months, 12)
+    return datetime.date(date.year + year, month + 1, day)
+
+
 def exit_application(message: str, code=1) -> None:
     print(message)
     exit(code)